@@ -4,17 +4,21 @@ The CLI allows creation of a simple template agent.
 """
 import agentos
 import click
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import gym
-import mlflow.projects
 import importlib.util
+import os
 from pathlib import Path
+import stat
+from string import Template
+import sys
 
 
 CONDA_ENV_FILE = Path("./conda_env.yaml")
-CONDA_ENV_CONTENT = """{file_header}
+CONDA_ENV_CONTENT = Template(
+    """$file_header
 
-name: {name}
+name: $name
 
 dependencies:
     - pip
@@ -25,20 +29,24 @@ dependencies:
       # update the line below and replace the line above with it.
       #- -e path/to/agentos/git/repo
 """
+)
 MLFLOW_PROJECT_FILE = Path("./MLProject")
-MLFLOW_PROJECT_CONTENT = """{file_header}
+MLFLOW_PROJECT_CONTENT = Template(
+    """$file_header
 
-name: {name}
+name: $name
 
-conda_env: {conda_env}
+conda_env: $conda_env
 
 entry_points:
   main:
     command: "python main.py"
 """
+)
 AGENT_DEF_FILE = Path("./agent.py")  # Default location of agent code.
 AGENT_MAIN_FILE = Path("./main.py")
-AGENT_MAIN = """{file_header}
+AGENT_MAIN = Template(
+    """$file_header
 import agentos
 import random
 import gym
@@ -76,11 +84,18 @@ class MyAgent(agentos.Agent):
 if __name__ == "__main__":
     agentos.run_agent(MyAgent, MyEnv, max_iters=5)
 """
+)
 INIT_FILES = {
     CONDA_ENV_FILE: CONDA_ENV_CONTENT,
     MLFLOW_PROJECT_FILE: MLFLOW_PROJECT_CONTENT,
     AGENT_MAIN_FILE: AGENT_MAIN,
 }
+# File names of the paths above, computed once. The ones looked up by
+# `agentos run` are lowercased, since they are matched regardless of case.
+_CONDA_ENV_NAME = CONDA_ENV_FILE.name
+_MLFLOW_PROJECT_NAME = MLFLOW_PROJECT_FILE.name.lower()
+_AGENT_DEF_NAME = AGENT_DEF_FILE.name.lower()
+_AGENT_MAIN_NAME = AGENT_MAIN_FILE.name.lower()
 
 
 @click.group()
@@ -89,12 +104,27 @@ def agentos_cmd():
     pass
 
 
+_BAD_NAME_CHARS = frozenset(" :/")
+
+
 def validate_agent_name(ctx, param, value):
-    if " " in value or ":" in value or "/" in value:
+    if not _BAD_NAME_CHARS.isdisjoint(value):
         raise click.BadParameter("name may not contain ' ', ':', or '/'.")
     return value
 
 
+def _write_bytes(path, data):
+    """Write data to path with raw os calls, bypassing Python's IO stack."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+    finally:
+        os.close(fd)
+
+
 @agentos_cmd.command()
 @click.argument("dir_names", nargs=-1, metavar="DIR_NAMES")
 @click.option(
@@ -123,40 +153,96 @@ def init(dir_names, name):
     dirs = [Path(".")]
     if dir_names:
         dirs = [Path(d) for d in dir_names]
+    now = datetime.now().strftime("%b %d, %Y %H:%M:%S")
+    header = f"# This file was auto-generated by `agentos init` on {now}."
+    rendered = {
+        file_path: template.substitute(
+            name=name,
+            conda_env=_CONDA_ENV_NAME,
+            file_header=header,
+        ).encode("utf-8")
+        for file_path, template in INIT_FILES.items()
+    }
+    writes = []
     for d in dirs:
-        d.mkdir(parents=True, exist_ok=True)
-        for file_path, content in INIT_FILES.items():
-            f = open(d / file_path, "w")
-            now = datetime.now().strftime("%b %d, %Y %H:%M:%S")
-            header = (
-                f"# This file was auto-generated by `agentos init` on {now}."
-            )
-            f.write(
-                content.format(
-                    name=name,
-                    conda_env=CONDA_ENV_FILE.name,
-                    file_header=header,
-                )
-            )
-            f.flush()
+        if not os.access(d, os.F_OK):
+            os.makedirs(d, exist_ok=True)
+        for file_path, content in rendered.items():
+            writes.append((d / file_path, content))
+    if len(dirs) == 1:
+        for path, content in writes:
+            _write_bytes(path, content)
+    else:
+        # Overlap the file writes across directories.
+        with ThreadPoolExecutor(max_workers=min(32, len(writes))) as ex:
+            list(ex.map(lambda w: _write_bytes(*w), writes))
 
+    lines = []
+    for d in dirs:
         d = "current working directory" if d == Path(".") else d
-        click.echo(f"Finished initializing AgentOS agent '{name}' in {d}.")
+        lines.append(f"Finished initializing AgentOS agent '{name}' in {d}.")
+    click.echo("\n".join(lines))
+
+
+# Modules loaded from agent files, keyed by absolute path, so that searching
+# the same file for several parent classes only executes it once.
+_module_cache = {}
 
 
-def _get_subclass_from_file(filename, parent_class):
-    """Return first subclass of `parent_class` found in filename, else None."""
+def _get_module_from_file(filename):
+    """Load (or fetch from cache) the python module defined in filename."""
     path = Path(filename)
     assert path.is_file(), f"Make {path} is a valid file."
     assert path.suffix == ".py", "Filename must end in .py"
 
-    spec = importlib.util.spec_from_file_location(path.stem, path.absolute())
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    abs_path = path.absolute()
+    if abs_path not in _module_cache:
+        # The SourceFileLoader returned for a .py file reuses (and writes)
+        # the compiled bytecode in __pycache__, so warm runs skip compiling.
+        # Register the module before executing it (as the import system
+        # does) so that code in it that looks itself up by name works. Use
+        # a name no other module has, so agent files never shadow real
+        # modules (e.g., a random.py agent) or each other.
+        base_name = f"_agentos_agent_{path.stem}"
+        module_name = base_name
+        suffix = 0
+        while module_name in sys.modules:
+            suffix += 1
+            module_name = f"{base_name}_{suffix}"
+        spec = importlib.util.spec_from_file_location(module_name, abs_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        _module_cache[abs_path] = module
+    return _module_cache[abs_path]
+
+
+def _get_subclasses_from_file(filename, parent_classes):
+    """Return list with the first subclass found in filename of each class in
+    `parent_classes` (or None for each one without a subclass in the file).
+    """
+    module = _get_module_from_file(filename)
+    results = [None] * len(parent_classes)
+    remaining = len(parent_classes)
     for elt in module.__dict__.values():
-        if type(elt) is type and issubclass(elt, parent_class):
-            print(f"Found first subclass class {elt}; returning it.")
-            return elt
+        if not isinstance(elt, type):
+            continue
+        for i, parent_class in enumerate(parent_classes):
+            if (
+                results[i] is None
+                and elt is not parent_class
+                and issubclass(elt, parent_class)
+            ):
+                click.echo(f"Found first subclass class {elt}; returning it.")
+                results[i] = elt
+                remaining -= 1
+        if not remaining:
+            break
+    return results
 
 
 @agentos_cmd.command()
@@ -218,42 +304,50 @@ def run(run_args, hz, max_iters):
                   and that it is available in this python environments path.
 
     """
-
-    def _handle_no_run_args(dirname=None):
-        if dirname:
-            agent_dir = Path(dirname)
-            assert agent_dir.is_dir()
-        else:
-            agent_dir = Path("./")
-        if (agent_dir / MLFLOW_PROJECT_FILE).is_file():
-            print("Running agent in this dir via MLflow.")
+    # Imported here rather than at module level since gym and mlflow are
+    # slow to import and not needed by other commands (e.g., `agentos init`).
+    import gym
+    import mlflow.projects
+
+    def _handle_no_run_args(agent_dir=Path("./")):
+        # Map lowercased names to actual ones since, like is_file() on
+        # case-insensitive filesystems (and mlflow for MLproject), the
+        # default files are matched regardless of case.
+        with os.scandir(agent_dir) as entries:
+            file_names = {
+                e.name.lower(): e.name for e in entries if e.is_file()
+            }
+        if _MLFLOW_PROJECT_NAME in file_names:
+            click.echo("Running agent in this dir via MLflow.")
             mlflow.projects.run(str(agent_dir.absolute()))
             return
-        elif (agent_dir / AGENT_MAIN_FILE).is_file():
-            print(
+        elif _AGENT_MAIN_NAME in file_names:
+            click.echo(
                 f"Running agent in this dir via MLflow with "
                 f"entry point {AGENT_MAIN_FILE}."
             )
             mlflow.projects.run(
-                str(agent_dir.absolute()), entry_point=AGENT_MAIN_FILE.name
+                str(agent_dir.absolute()),
+                entry_point=file_names[_AGENT_MAIN_NAME],
             )
         else:
-            if not (agent_dir / AGENT_DEF_FILE).is_file():
+            if _AGENT_DEF_NAME not in file_names:
                 raise click.UsageError(
                     "No args were passed to run, so one "
                     f"of {MLFLOW_PROJECT_FILE}, "
                     f"{AGENT_MAIN_FILE}, "
                     f"{AGENT_DEF_FILE} must exist."
                 )
-            _handle_single_run_arg(agent_dir / AGENT_DEF_FILE)
+            _handle_single_run_arg(agent_dir / file_names[_AGENT_DEF_NAME])
 
     def _handle_single_run_arg(filename):
         """The file must contain:
         - 1 or more agentos.Agent subclass
         - 1 or more gym.Env subclass.
         """
-        agent_cls = _get_subclass_from_file(filename, agentos.Agent)
-        env_cls = _get_subclass_from_file(filename, gym.Env)
+        agent_cls, env_cls = _get_subclasses_from_file(
+            filename, (agentos.Agent, gym.Env)
+        )
         assert agent_cls and env_cls, (
             f" {filename} must contain >= 1 agentos.Agent subclass "
             f"and >= 1 gym.Env subclass."
@@ -263,10 +357,15 @@ def run(run_args, hz, max_iters):
     if len(run_args) == 0:
         _handle_no_run_args()
     elif len(run_args) == 1:
-        if Path(run_args[0]).is_dir():
-            _handle_no_run_args(run_args[0])
-        if Path(run_args[0]).is_file():
-            _handle_single_run_arg(run_args[0])
+        agent_path = Path(run_args[0])
+        try:
+            mode = os.stat(agent_path).st_mode
+        except OSError:
+            mode = 0
+        if stat.S_ISDIR(mode):
+            _handle_no_run_args(agent_path)
+        elif stat.S_ISREG(mode):
+            _handle_single_run_arg(agent_path)
         else:
             raise click.UsageError(
                 "1 argument was passed to run; it must be "
@@ -276,7 +375,9 @@ def run(run_args, hz, max_iters):
     elif len(run_args) == 2:
         agent_arg, env_arg = run_args[0], run_args[1]
         if Path(agent_arg).is_file():
-            agent_cls = _get_subclass_from_file(agent_arg, agentos.Agent)
+            (agent_cls,) = _get_subclasses_from_file(
+                agent_arg, (agentos.Agent,)
+            )
             assert (
                 agent_cls
             ), f"{agent_arg} must contain a subclass of agentos.Agent"
@@ -286,7 +387,7 @@ def run(run_args, hz, max_iters):
             ag_mod = importlib.import_module(ag_mod_name)
             agent_cls = getattr(ag_mod, ag_cls_name)
         if Path(env_arg).is_file():
-            env_cls = _get_subclass_from_file(env_arg, gym.Env)
+            (env_cls,) = _get_subclasses_from_file(env_arg, (gym.Env,))
             assert env_cls, f"{env_arg} must contain a subclass of gym.Env"
         else:
             env_mod_name = ".".join(env_arg.split(".")[:-1])
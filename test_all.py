@@ -35,6 +35,23 @@ def test_cli(tmpdir):
     for c in commands:
         subprocess.run(c, cwd=tmpdir, check=True)
 
+    # Multiple (and nested, not yet existing) dirs are all initialized.
+    subprocess.run(["agentos", "init", "a", "b/c"], cwd=tmpdir, check=True)
+    for d in ["a", "b/c"]:
+        for f in ["main.py", "MLProject", "conda_env.yaml"]:
+            assert (Path(tmpdir) / d / f).is_file()
+
+    # A dir arg is run like `agentos run` inside it; with only an agent.py
+    # there, that file's Agent and Env subclasses are used.
+    agent_dir = Path(tmpdir) / "agent_dir"
+    agent_dir.mkdir()
+    (agent_dir / "agent.py").write_text(main.read_text())
+    subprocess.run(
+        ["agentos", "run", "--max-iters", "5", "agent_dir"],
+        cwd=tmpdir,
+        check=True,
+    )
+
     # TODO(andyk): add functionality for creating a conda env
     #              automatically if an MLProject file does not
     #              exist but a main.py and requirements.txt do exist.
@@ -48,6 +65,31 @@ def test_cli(tmpdir):
     #             them all working as we update the core APIs.
 
 
+def test_get_subclasses_from_file(tmpdir):
+    import agentos
+    import gym
+    from agentos.cli import _get_subclasses_from_file
+
+    agent_file = Path(tmpdir) / "abc_agent.py"
+    agent_file.write_text(
+        "import abc\n"
+        "from gym import Env\n"
+        "import agentos\n"
+        "\n"
+        "class MyEnv(Env):\n"
+        "    pass\n"
+        "\n"
+        "class MyAgent(agentos.Agent, abc.ABC):\n"
+        "    pass\n"
+    )
+    agent_cls, env_cls = _get_subclasses_from_file(
+        agent_file, (agentos.Agent, gym.Env)
+    )
+    assert agent_cls.__name__ == "MyAgent"
+    assert env_cls is not gym.Env
+    assert env_cls.__name__ == "MyEnv"
+
+
 ######################
 # Example Agent Tests
 ######################